@@ -1,26 +1,50 @@
-import os, re, time, hmac, hashlib, json
-from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
+import os, re, ssl, time, hmac, json, base64, logging, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from slack_sdk.web import WebClient
 from slack_sdk.errors import SlackApiError
+from slack_sdk.http_retry.builtin_handlers import ConnectionErrorRetryHandler, RateLimitErrorRetryHandler
+try:
+    # orjson is much faster for request parsing; stdlib json keeps local runs working without it
+    import orjson
+    _json_loads = orjson.loads
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    _json_loads = json.loads
+    _json_dumps = json.dumps
 from scheduling import (
     SchedulingConfig,
-    is_within_business_hours,
-    next_reminder_in_business_hours,
-    next_business_hour_slot_from_epoch,
-    calculate_initial_schedule
+    calculate_initial_schedule,
+    calculate_topup_schedule,
+    calculate_window_target,
+    format_local_time
 )
 
+# Lambda pre-configures the root logger; LOG_LEVEL=DEBUG enables the verbose request dumps
+logger = logging.getLogger()
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
+
 # Required env vars
 SLACK_BOT_TOKEN = os.environ["SLACK_BOT_TOKEN"]
 SLACK_SIGNING_SECRET = os.environ["SLACK_SIGNING_SECRET"]
+_SIGNING_SECRET_BYTES = SLACK_SIGNING_SECRET.encode("utf-8")  # encoded once, reused for every signature check
+_SIG_DIGEST = "sha256"  # named digest so hmac uses OpenSSL's implementation directly
+# Keyed once; each verification copies this state instead of re-deriving the HMAC key pads
+_SIGNING_MAC = hmac.new(_SIGNING_SECRET_BYTES, digestmod=_SIG_DIGEST)
 
 # Optional config
 WINDOW_SIZE = int(os.environ.get("WINDOW_SIZE", "2"))  # how many business days to maintain reminders
 REMINDER_INTERVAL_HOURS = int(os.environ.get("REMINDER_INTERVAL_HOURS", "3"))  # hours between reminders during business hours
 BUSINESS_HOURS_START = int(os.environ.get("BUSINESS_HOURS_START", "9"))  # 9am
 BUSINESS_HOURS_END = int(os.environ.get("BUSINESS_HOURS_END", "17"))  # 5pm
-MEL_TZ = ZoneInfo("Australia/Melbourne")
+TOPUP_BUDGET_SECONDS = int(os.environ.get("TOPUP_BUDGET_SECONDS", "10"))  # wall-clock budget for one top-up run, under the 15s Lambda timeout
+MAX_SCHEDULED_PAGES = int(os.environ.get("MAX_SCHEDULED_PAGES", "50"))  # hard cap on chat.scheduledMessages.list pages per workspace-wide scan
+SCHEDULED_PAGE_LIMIT = int(os.environ.get("SCHEDULED_PAGE_LIMIT", "200"))  # messages requested per chat.scheduledMessages.list page
+SCHEDULED_PAGE_DELAY = float(os.environ.get("SCHEDULED_PAGE_DELAY", "0"))  # seconds to pause between pages, to stay under Slack's tier limit
+SLACK_MAX_WORKERS = int(os.environ.get("SLACK_MAX_WORKERS", "4"))  # max concurrent Slack API calls for bulk operations
+SLACK_SCHEDULE_PER_MINUTE = int(os.environ.get("SLACK_SCHEDULE_PER_MINUTE", "0"))  # top-up chat.scheduleMessage pace; 0 = unpaced
 
 # Create scheduling config
 SCHEDULING_CONFIG = SchedulingConfig(
@@ -32,190 +56,339 @@ SCHEDULING_CONFIG = SchedulingConfig(
 )
 
 # Slack client and patterns
-client = WebClient(token=SLACK_BOT_TOKEN)
+# One TLS context for the container lifetime; without it urllib rebuilds a context (and reloads
+# the CA bundle) for every Slack API call
+_SSL_CONTEXT = ssl.create_default_context()
+SLACK_API_TIMEOUT = int(os.environ.get("SLACK_API_TIMEOUT", "5"))  # seconds per Slack API call, well under the Lambda timeout
+SLACK_RATE_LIMIT_RETRIES = int(os.environ.get("SLACK_RATE_LIMIT_RETRIES", "1"))  # 429 retries after Retry-After, per call
+SLACK_ACK_SECONDS = 3  # Slack redelivers an event that is not acknowledged within this many seconds
+
+# Monotonic time by which the current invocation has to be done with Slack: the top-up budget for
+# EventBridge runs, Slack's ack window for events. Rate-limit retries never wait past it.
+_slack_deadline = 0.0
+
+class _DeadlineRateLimitRetryHandler(RateLimitErrorRetryHandler):
+    """Retries a 429 only when its Retry-After wait ends before the current invocation's deadline"""
+
+    def _can_retry(self, *, state, request, response=None, error=None) -> bool:
+        if not super()._can_retry(state=state, request=request, response=response, error=error):
+            return False
+        retry_after = next((v[0] for k, v in response.headers.items() if k.lower() == "retry-after"), "1")
+        try:
+            wait = int(retry_after) + 1  # the SDK adds up to a second of jitter to Retry-After
+        except ValueError:
+            return False
+        return time.monotonic() + wait <= _slack_deadline
+
+client = WebClient(
+    token=SLACK_BOT_TOKEN,
+    ssl=_SSL_CONTEXT,
+    timeout=SLACK_API_TIMEOUT,
+    # The SDK retries inside the HTTP layer; keep its default connection-error handler alongside
+    retry_handlers=[ConnectionErrorRetryHandler(), _DeadlineRateLimitRetryHandler(max_retry_count=SLACK_RATE_LIMIT_RETRIES)]
+)
 
-# In-memory event deduplication (survives for Lambda container lifetime)
-_processed_events = set()
+# In-memory event deduplication (survives for Lambda container lifetime): event_id -> monotonic time last seen,
+# oldest first. Slack gives up retrying within minutes, so IDs expire after an hour or when the cache is full.
+MAX_PROCESSED_EVENTS = 1000
+PROCESSED_EVENT_TTL_SECONDS = 60 * 60
+_processed_events: "OrderedDict[str, float]" = OrderedDict()
 
+# Not re.ASCII: \s must keep covering Unicode whitespace (e.g. NBSP) so it still ends the owner/repo segments
 PR_RE = re.compile(r"https?://github\.com/[^/\s]+/[^/\s]+/pull/\d+")
-MARKER_RE = re.compile(r"\[PR-NUDGE ch=([A-Z0-9]+) ts=([0-9]+\.[0-9]+) url=<?(.+?)>?\]")
+# Approval keyword anywhere in the mention text (case-insensitive, covers :approved:)
+APPROVED_RE = re.compile(r"approved", re.ASCII | re.IGNORECASE)
+# The URL class excludes its own terminators, so the match never has to backtrack. Every class here is
+# explicit, so re.ASCII only spares the matcher Unicode lookups and cannot change what matches.
+MARKER_RE = re.compile(r"\[PR-NUDGE ch=([A-Z0-9]+) ts=([0-9]+\.[0-9]+) url=<?([^>\]\n]+)>?\]", re.ASCII)
 MARKER_FMT = "[PR-NUDGE ch={} ts={} url={}]"
+MARKER_PREFIX = "[PR-NUDGE "  # _nudge_text always writes the marker at the start of the text
+
+# Edited messages older than this are scheduled from the current time instead of the original ts
+EDITED_MESSAGE_MAX_AGE_SECONDS = 60 * 60
 
 REMINDER_TEXT = os.environ.get(
     "REMINDER_TEXT",
     "Friendly nudge: no emoji reaction yet on this PR. React with 👀 if you’re taking it; mention me in the threadwith :approved: emoji when approved. Thanks!"
 )
 
-def _verify_slack_signature(headers, body: str) -> bool:
+def _scan_mention_text(text: str) -> tuple[str | None, bool]:
+    """Return the first PR URL in the text (if any) and whether approval was mentioned anywhere in it"""
+    approved = APPROVED_RE.search(text) is not None
+    # Most mentions carry no link at all; a literal find settles that before any PR pattern matching
+    if text.find("github.com/") == -1:
+        return None, approved
+    m = PR_RE.search(text)
+    return (m.group(0) if m else None), approved
+
+def _verify_slack_signature(headers, body: str | bytes) -> bool:
     # API Gateway may case-normalize headers; prefer lowercase keys
     timestamp = headers.get("x-slack-request-timestamp") or headers.get("X-Slack-Request-Timestamp")
     signature = headers.get("x-slack-signature") or headers.get("X-Slack-Signature")
     if not timestamp or not signature:
         return False
+    # Reject malformed headers before paying for the HMAC: "v0=" followed by a hex SHA-256 digest
+    if not signature.startswith("v0=") or len(signature) != 3 + 64:
+        return False
+    # int() would also accept padding and non-ASCII digits, which the ASCII signing base below cannot encode
+    if not (timestamp.isascii() and timestamp.isdigit()):
+        return False
+    try:
+        ts_int = int(timestamp)
+        provided = bytes.fromhex(signature[3:])
+    except ValueError:
+        return False
     # Replay guard (5 minutes)
-    if abs(time.time() - int(timestamp)) > 60 * 5:
+    if abs(time.time() - ts_int) > 60 * 5:
         return False
-    basestring = f"v0:{timestamp}:{body}"
-    my_sig = "v0=" + hmac.new(
-        SLACK_SIGNING_SECRET.encode("utf-8"),
-        basestring.encode("utf-8"),
-        hashlib.sha256
-    ).hexdigest()
-    return hmac.compare_digest(my_sig, signature)
-
-# Wrapper functions that use the scheduling module with global config
-def _is_within_business_hours(dt_local: datetime) -> bool:
-    """Check if a datetime is within business hours (Mon-Fri, 9am-5pm Melbourne time)"""
-    return is_within_business_hours(dt_local, SCHEDULING_CONFIG)
-
-def _next_reminder_in_business_hours(from_epoch: float, interval_hours: int) -> int:
-    """Calculate the next reminder time by adding interval_hours to from_epoch"""
-    return next_reminder_in_business_hours(from_epoch, interval_hours, SCHEDULING_CONFIG)
-
-def _next_business_hour_slot_from_epoch(epoch_utc: float) -> int:
-    """Find the next available business hour slot from a given epoch"""
-    return next_business_hour_slot_from_epoch(epoch_utc, SCHEDULING_CONFIG)
+    # Feed the HMAC incrementally so the body is never copied into a combined basestring
+    mac = _SIGNING_MAC.copy()
+    mac.update(b"v0:" + timestamp.encode("ascii") + b":")
+    mac.update(body.encode("utf-8") if isinstance(body, str) else body)
+    return hmac.compare_digest(mac.digest(), provided)
 
-def _schedule_nudge(channel: str, thread_ts: str, post_at: int, original_ts: str, pr_url: str = ""):
+def _is_duplicate_event(event_id: str) -> bool:
+    """Record event_id as seen now; True if it was already seen within PROCESSED_EVENT_TTL_SECONDS"""
+    now = time.monotonic()
+    # Entries are ordered by last sighting, so expired IDs are always at the front
+    while _processed_events and now - next(iter(_processed_events.values())) > PROCESSED_EVENT_TTL_SECONDS:
+        _processed_events.popitem(last=False)
+    duplicate = event_id in _processed_events
+    _processed_events[event_id] = now
+    _processed_events.move_to_end(event_id)
+    # Keep only the last MAX_PROCESSED_EVENTS event IDs to prevent unbounded memory growth
+    if len(_processed_events) > MAX_PROCESSED_EVENTS:
+        _processed_events.popitem(last=False)
+    return duplicate
+
+def _is_timeout_retry(headers) -> bool:
+    """
+    Slack redelivers an event with X-Slack-Retry-Num when our 3-second ack is late.
+    For http_timeout retries the original delivery is still being processed, so the retry can be dropped.
+    """
+    retry_num = headers.get("x-slack-retry-num") or headers.get("X-Slack-Retry-Num")
+    retry_reason = headers.get("x-slack-retry-reason") or headers.get("X-Slack-Retry-Reason")
+    return bool(retry_num) and retry_num != "0" and retry_reason == "http_timeout"
+
+def _run_concurrently(fn, items: list) -> list:
+    """Run fn over items on a bounded thread pool, returning results in input order"""
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(SLACK_MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(fn, items))
+
+@lru_cache(maxsize=256)
+def _nudge_text(channel: str, original_ts: str, pr_url: str) -> str:
+    """Full scheduled-message text for a PR thread (identical for every nudge in the thread)"""
     marker = MARKER_FMT.format(channel, original_ts, pr_url)
     # Replace "this PR" with a link to the PR
     reminder_text = REMINDER_TEXT.replace("this PR", f"<{pr_url}|this PR>") if pr_url else REMINDER_TEXT
+    return f"{marker} {reminder_text}"
+
+def _schedule_nudge(channel: str, thread_ts: str, post_at: int, original_ts: str, pr_url: str = ""):
     client.chat_scheduleMessage(
         channel=channel,
-        text=f"{marker} {reminder_text}",
+        text=_nudge_text(channel, original_ts, pr_url),
         post_at=post_at,
         thread_ts=thread_ts,
         reply_broadcast=True
     )
 
-def _get_existing_scheduled_times_for_thread(channel: str, original_ts: str) -> set[int]:
-    """Get all existing scheduled times for a specific PR thread"""
-    existing_times = set()
-    marker_prefix = f"[PR-NUDGE ch={channel} ts={original_ts}"
-    cursor = None
-    
-    while True:
-        resp = client.chat_scheduledMessages_list(channel=channel, limit=100, cursor=cursor)
-        for item in resp.get("scheduled_messages", []):
-            if marker_prefix in (item.get("text") or ""):
-                existing_times.add(int(item.get("post_at")))
-        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
-        if not cursor:
-            break
-    
-    return existing_times
-
-def _schedule_nudge_if_not_exists(channel: str, thread_ts: str, post_at: int, original_ts: str, existing_times: set[int], pr_url: str = "") -> bool:
-    """Schedule a nudge only if no message is already scheduled for that time"""
-    if post_at not in existing_times:
-        _schedule_nudge(channel, thread_ts, post_at, original_ts, pr_url)
-        existing_times.add(post_at)  # Update the set to prevent future duplicates in same batch
-        return True
-    else:
-        print(f"Skipping duplicate: reminder already scheduled at {post_at}")
-    return False
-
-def _delete_scheduled_nudges_for_thread(channel: str, original_ts: str):
-    # Cancel all scheduled messages for this PR thread by matching the marker
-    cursor = None
-    # Use partial marker match since URL might vary
-    marker_prefix = f"[PR-NUDGE ch={channel} ts={original_ts}"
-    while True:
-        resp = client.chat_scheduledMessages_list(channel=channel, limit=100, cursor=cursor)
-        for item in resp.get("scheduled_messages", []):
-            if marker_prefix in (item.get("text") or ""):
-                try:
-                    client.chat_deleteScheduledMessage(
-                        channel=channel,
-                        scheduled_message_id=item["id"]
-                    )
-                except SlackApiError as e:
-                    print(f"delete scheduled failed: {e}")
-        cursor = (resp.get("response_metadata") or {}).get("next_cursor")
-        if not cursor:
-            break
+def _parse_marker(text: str) -> tuple[str, str, str] | None:
+    """
+    Split a leading PR-NUDGE marker into (channel, original_ts, pr_url), or None if the text has none.
+    Markers as _nudge_text writes them are sliced apart directly; anything unusual goes through MARKER_RE.
+    """
+    if not text.startswith(MARKER_PREFIX):
+        return None
+    end = text.find("]", len(MARKER_PREFIX))
+    if end != -1:
+        channel, _, rest = text[len(MARKER_PREFIX):end].partition(" ts=")
+        original_ts, _, pr_url = rest.partition(" url=")
+        if pr_url[:1] == "<" and pr_url[-1:] == ">":  # Slack auto-links the URL
+            pr_url = pr_url[1:-1]
+        channel = channel[3:] if channel.startswith("ch=") else ""
+        seconds, dot, fraction = original_ts.partition(".")
+        if (channel.isascii() and channel.isalnum() and channel == channel.upper()
+                and original_ts.isascii() and dot and seconds.isdigit() and fraction.isdigit()
+                and pr_url and not any(c in pr_url for c in "<>\n")):
+            return channel, original_ts, pr_url
+    m = MARKER_RE.match(text)
+    return m.groups() if m else None
 
-def _top_up_all_channels():
+def _list_scheduled_nudges(channel: str | None = None, wanted: set[str] | None = None, deadline: float | None = None, latest: int | None = None) -> tuple[dict[str, dict[str, tuple[list[tuple[int, str]], str]]], bool]:
     """
-    Maintain a rolling window of WINDOW_SIZE future reminders for each PR thread
-    across all channels. Discovers channels from PR markers in scheduled messages.
+    Paginate scheduled messages once and group PR nudges by channel and thread.
+    If wanted is given, only threads whose original_ts is in that set are kept.
+    If latest is given, Slack only returns messages due at or before it.
+    Pagination pauses SCHEDULED_PAGE_DELAY seconds between pages and stops once the monotonic deadline passes.
+    Workspace-wide scans also stop after MAX_SCHEDULED_PAGES pages; a channel scan always reads to the end,
+    since cancelling or de-duplicating a thread's reminders from a partial read would miss some of them.
+    Returns (channel -> {original_ts -> (list[(post_at, scheduled_message_id)], pr_url)}, complete)
     """
-    # Group scheduled messages by channel and thread
-    channel_groups: dict[str, dict[str, tuple[list[int], str]]] = {}  # channel -> {original_ts -> (list[post_at], pr_url)}
-    
-    # List all scheduled messages (channel ID is embedded in marker now)
+    nudges: dict[str, dict[str, tuple[list[tuple[int, str]], str]]] = {}
+    # Messages due before now have already been posted; let Slack skip them server-side
+    oldest = int(time.time())
     cursor = None
-    while True:
-        resp = client.chat_scheduledMessages_list(limit=100, cursor=cursor)
+    pages = 0
+    while channel is not None or pages < MAX_SCHEDULED_PAGES:
+        if deadline is not None and time.monotonic() > deadline:
+            break
+        if pages and SCHEDULED_PAGE_DELAY > 0:
+            time.sleep(SCHEDULED_PAGE_DELAY)
+        pages += 1
+        resp = client.chat_scheduledMessages_list(channel=channel, oldest=oldest, latest=latest, limit=SCHEDULED_PAGE_LIMIT, cursor=cursor)
         messages = resp.get("scheduled_messages", [])
-        print(f"DEBUG: Retrieved {len(messages)} scheduled messages from Slack API")
+        logger.debug("Retrieved %d scheduled messages from Slack API", len(messages))
         
         for item in messages:
-            text = item.get("text", "") or ""
-            m = MARKER_RE.search(text)
-            if not m:
+            marker = _parse_marker(item.get("text") or "")
+            if not marker or (wanted is not None and marker[1] not in wanted):
                 continue
-            
-            channel = m.group(1)  # Extract from marker: ch=XXX
-            original_ts = m.group(2)
-            pr_url = m.group(3)
             post_at = int(item.get("post_at"))
+            if post_at < oldest:  # Safety net in case the filter is not applied
+                continue
             
-            if channel not in channel_groups:
-                channel_groups[channel] = {}
-            if original_ts not in channel_groups[channel]:
-                channel_groups[channel][original_ts] = ([], pr_url)
-            channel_groups[channel][original_ts][0].append(post_at)
+            # Channel ID is embedded in the marker: ch=XXX
+            channel_id, original_ts, pr_url = marker
+            thread = nudges.setdefault(channel_id, {}).setdefault(original_ts, ([], pr_url))
+            thread[0].append((post_at, item.get("id")))
         
         cursor = (resp.get("response_metadata") or {}).get("next_cursor")
         if not cursor:
+            return nudges, True
+    
+    logger.warning("Scheduled message scan truncated after %d page(s)", pages)
+    return nudges, False
+
+def _get_existing_scheduled_times_for_thread(channel: str, original_ts: str, nudges: dict | None = None) -> set[int]:
+    """Get all existing scheduled times for a specific PR thread"""
+    if nudges is None:
+        nudges, _ = _list_scheduled_nudges(channel, {original_ts})
+    post_ats, _ = nudges.get(channel, {}).get(original_ts, ([], ""))
+    return {post_at for post_at, _ in post_ats}
+
+def _delete_scheduled_message(channel: str, scheduled_message_id: str) -> bool:
+    """Best-effort delete of one scheduled message; returns False (after logging) if it failed"""
+    try:
+        client.chat_deleteScheduledMessage(channel=channel, scheduled_message_id=scheduled_message_id)
+        return True
+    except SlackApiError as e:
+        print(f"delete scheduled failed: {e}")
+        return False
+
+def _delete_scheduled_nudges_for_thread(channel: str, original_ts: str, nudges: dict | None = None) -> tuple[int, int]:
+    """Cancel all scheduled messages for this PR thread; returns (cancelled, found), both 0 if it had none"""
+    if nudges is None:
+        nudges, _ = _list_scheduled_nudges(channel, {original_ts})
+    post_ats, _ = nudges.get(channel, {}).get(original_ts, ([], ""))
+    # Deletes are independent, so fire them concurrently instead of one round trip at a time
+    deleted = _run_concurrently(
+        lambda scheduled_message_id: _delete_scheduled_message(channel, scheduled_message_id),
+        [scheduled_message_id for _, scheduled_message_id in post_ats]
+    )
+    return sum(deleted), len(post_ats)
+
+# Monotonic time the next paced top-up send may start, shared by the worker threads
+_schedule_pace_lock = threading.Lock()
+_next_schedule_slot = 0.0
+
+def _wait_for_schedule_slot(deadline: float) -> bool:
+    """
+    Space top-up sends SLACK_SCHEDULE_PER_MINUTE apart across all workers.
+    Returns False without waiting if the next free slot falls past the deadline.
+    """
+    global _next_schedule_slot
+    if SLACK_SCHEDULE_PER_MINUTE <= 0:
+        return True
+    with _schedule_pace_lock:
+        now = time.monotonic()
+        slot = max(now, _next_schedule_slot)
+        if slot > deadline:
+            return False
+        _next_schedule_slot = slot + 60 / SLACK_SCHEDULE_PER_MINUTE
+    if slot > now:
+        time.sleep(slot - now)
+    return True
+
+def _schedule_top_up_nudge(task: tuple[str, str, int, str]) -> bool:
+    """Schedule one planned top-up reminder; returns False (after logging) if it failed"""
+    channel, original_ts, post_at, pr_url = task
+    try:
+        _schedule_nudge(channel, original_ts, post_at, original_ts, pr_url)
+        print(f"Scheduled reminder at {format_local_time(post_at, SCHEDULING_CONFIG)} for thread {original_ts}")
+        return True
+    except SlackApiError as e:
+        print(f"top-up schedule failed for channel {channel}: {e}")
+        return False
+
+def _schedule_top_up_thread(thread: tuple[str, str, list[int], str], deadline: float) -> int:
+    """
+    Schedule one thread's planned top-up reminders in order; returns how many were sent.
+    The next run continues from the thread's latest reminder, so the chain stops at the first
+    slot that fails or is refused by the deadline or pacing, instead of leaving a gap that would never be filled.
+    """
+    channel, original_ts, post_ats, pr_url = thread
+    scheduled = 0
+    for post_at in post_ats:
+        if time.monotonic() > deadline or not _wait_for_schedule_slot(deadline):
             break
+        if not _schedule_top_up_nudge((channel, original_ts, post_at, pr_url)):
+            break
+        scheduled += 1
+    return scheduled
+
+def _top_up_all_channels() -> dict:
+    """
+    Maintain a rolling window of WINDOW_SIZE future reminders for each PR thread
+    across all channels. Discovers channels from PR markers in scheduled messages.
+    Runs within TOPUP_BUDGET_SECONDS and returns a summary of what was done.
+    """
+    global _slack_deadline
+    deadline = time.monotonic() + TOPUP_BUDGET_SECONDS
+    _slack_deadline = deadline
+    now = time.time()
+    # The window target depends only on now, so every thread shares it
+    target = calculate_window_target(now, SCHEDULING_CONFIG)
+    
+    # Group scheduled messages by channel and thread (channel ID is embedded in marker now).
+    # Nudges are never scheduled past the window target, so later messages can stay on Slack's side.
+    channel_groups, complete = _list_scheduled_nudges(deadline=deadline, latest=target)
+    if not complete:
+        # A thread's latest reminder may sit on an unread page, so topping up from this scan could duplicate it.
+        # Re-read each channel seen so far on its own and top up only those whose scan finishes.
+        logger.warning("Top-up scan truncated; rescanning %d channel(s) individually", len(channel_groups))
+        channels = list(channel_groups)
+        rescans = _run_concurrently(
+            lambda channel: _list_scheduled_nudges(channel, deadline=deadline, latest=target), channels
+        )
+        channel_groups = {}
+        for channel, (groups, channel_complete) in zip(channels, rescans):
+            if channel_complete:
+                channel_groups[channel] = groups.get(channel, {})
+            else:
+                logger.warning("Skipping top-up for channel %s: scheduled message scan incomplete", channel)
+    threads = sum(len(groups) for groups in channel_groups.values())
     
     print(f"Found PR reminders in {len(channel_groups)} channel(s)")
     
-    # Top up each channel
+    # Plan every thread's missing reminders first (pure computation), then top up the threads concurrently
+    tasks: list[tuple[str, str, list[int], str]] = []  # (channel, original_ts, post_ats in order, pr_url)
     for channel, groups in channel_groups.items():
         print(f"Topping up channel {channel} with {len(groups)} PR thread(s)")
         
-        for original_ts, (post_ats, pr_url) in groups.items():
-            post_ats.sort()
-            
-            # Calculate target: WINDOW_SIZE business days from now
-            now = time.time()
-            now_dt = datetime.fromtimestamp(now, tz=timezone.utc).astimezone(MEL_TZ)
-            target_dt = now_dt
-            days_added = 0
-            while days_added < WINDOW_SIZE:
-                target_dt += timedelta(days=1)
-                if target_dt.weekday() < 5:  # Mon-Fri only
-                    days_added += 1
-            # Set target to end of business hours on the target day
-            target_timestamp = int(target_dt.replace(hour=BUSINESS_HOURS_END, minute=0, second=0, microsecond=0).timestamp())
-            
-            # Keep adding reminders until we have coverage through target date
-            while not post_ats or post_ats[-1] < target_timestamp:
-                # Get the base time (last scheduled or first business hour slot from original message)
-                if post_ats:
-                    base = post_ats[-1]
-                else:
-                    base = _next_business_hour_slot_from_epoch(float(original_ts))
-                
-                # Calculate next reminder time using interval
-                next_pa = _next_reminder_in_business_hours(base, REMINDER_INTERVAL_HOURS)
-                
-                # Stop if next reminder exceeds target (don't schedule beyond window)
-                if next_pa > target_timestamp:
-                    break
-                
-                try:
-                    _schedule_nudge(channel, original_ts, next_pa, original_ts, pr_url)
-                    post_ats.append(next_pa)
-                    next_dt = datetime.fromtimestamp(next_pa, tz=timezone.utc).astimezone(MEL_TZ)
-                    print(f"Scheduled reminder at {next_dt.strftime('%Y-%m-%d %H:%M')} for thread {original_ts}")
-                except SlackApiError as e:
-                    print(f"top-up schedule failed for channel {channel}: {e}")
-                    break
-                
+        for original_ts, (entries, pr_url) in groups.items():
+            post_ats = [post_at for post_at, _ in entries]
+            next_post_ats = calculate_topup_schedule(post_ats, now, float(original_ts), SCHEDULING_CONFIG, target)
+            if next_post_ats:
+                tasks.append((channel, original_ts, next_post_ats, pr_url))
+    
+    planned = sum(len(post_ats) for _, _, post_ats, _ in tasks)
+    scheduled = sum(_run_concurrently(lambda thread: _schedule_top_up_thread(thread, deadline), tasks))
+    if scheduled < planned and time.monotonic() > deadline:
+        logger.warning("Top-up truncated: budget exhausted after %d of %d reminder(s)", scheduled, planned)
+    return {"complete": complete and scheduled == planned, "threads": threads, "planned": planned, "scheduled": scheduled}
+
 def _is_already_reacted(text: str) -> bool:
     return text == "already_reacted"
     
@@ -249,39 +422,239 @@ def _add_check_mark(channel, message_ts) -> bool:
             raise
     return True
 
-def lambda_handler(event, context):
-    print(f"Received event: {json.dumps(event)}")  # Debug logging
+def _handle_app_mention(ev: dict):
+    """Schedule reminders for a PR mention, or cancel them when a thread reply says approved"""
+    channel = ev.get("channel")
+    message_ts = ev.get("ts")
+    text = ev.get("text", "")
+    thread_ts = ev.get("thread_ts")  # Present if this is a thread reply
+    
+    logger.debug("app_mention event - Channel: %s, Text: %s, Thread: %s", channel, text, thread_ts)
+    
+    # Extract PR URL and approval indicator in one pass (works with both plain URLs and markdown links)
+    pr_url, approved = _scan_mention_text(text)
     
-    # EventBridge scheduled top-up branch
+    # Check if this is a thread reply requesting cancellation
+    if thread_ts and thread_ts != message_ts:
+        # This is a reply in a thread (not the parent message)
+        print(f"Detected thread reply, checking for cancellation request")
+        
+        # Check if message contains :approved: emoji
+        if approved:
+            print(f"Found approval indicator, checking if parent has PR reminders")
+            
+            # Cancel the parent message's scheduled reminders; the delete pass reports whether any existed
+            try:
+                cancelled, found = _delete_scheduled_nudges_for_thread(channel, thread_ts)
+                if cancelled < found:
+                    # Some reminders are still scheduled, so don't confirm; approving again retries the rest
+                    print(f"Cancelled only {cancelled} of {found} reminder(s) for thread {thread_ts}")
+                    try:
+                        client.reactions_add(
+                            channel=channel,
+                            timestamp=message_ts,
+                            name="x"
+                        )
+                    except SlackApiError as reaction_err:
+                        if not _is_already_reacted(reaction_err.response.get("error")):
+                            print(f"Failed to add :x: reaction: {reaction_err}")
+                    return
+                if cancelled > 0:
+                    print(f"Parent message had {cancelled} reminder(s), cancelled all scheduled messages")
+                    
+                    # React to confirm cancellation
+                    _add_check_mark(channel, message_ts)
+                    print(f"Successfully cancelled reminders for thread {thread_ts}")
+                    return
+                else:
+                    print(f"No reminders found for thread {thread_ts}")
+                    
+                    if(_is_check_mark_reacted(channel, message_ts)):
+                        print(f"Already processed successfully (✅ exists), skipping ❓")
+                        return
+                    
+                    # Genuinely no reminders found - react with question mark
+                    try:
+                        client.reactions_add(
+                            channel=channel,
+                            timestamp=message_ts,
+                            name="question"
+                        )
+                    except SlackApiError as reaction_err:
+                        if _is_already_reacted(reaction_err.response.get("error")):
+                            print(f"Already processed (reaction exists), skipping")
+                        else:
+                            raise
+                    return
+            
+            except SlackApiError as e:
+                print(f"Error checking/cancelling reminders: {e}")
+                # React with X to indicate error (unless already reacted)
+                if _is_already_reacted(e.response.get("error")):
+                    try:
+                        client.reactions_add(
+                            channel=channel,
+                            timestamp=message_ts,
+                            name="x"
+                        )
+                    except:
+                        pass
+                return
+    
+    # Reject PR links posted in threads (not as parent message)
+    if pr_url and thread_ts and thread_ts != message_ts:
+        print(f"PR link found in thread reply - rejecting. PR reminders must be created on parent messages, not in threads.")
+        try:
+            client.reactions_add(
+                channel=channel,
+                timestamp=message_ts,
+                name="x"
+            )
+        except SlackApiError as e:
+            if not _is_already_reacted(e.response.get("error")):
+                print(f"Failed to add :x: reaction: {e}")
+        return
+    
+    if pr_url and channel and message_ts:
+        print(f"Found PR URL: {pr_url}")
+        
+        try:
+            # Schedule reminders for this message using interval-based logic
+            # If message was edited and the original timestamp is too old, use current time as base
+            now = time.time()
+            edited_info = ev.get("edited")
+            base_ts = float(message_ts)
+            
+            # Check if message was edited and if original timestamp would cause past scheduling
+            if edited_info:
+                print(f"Message was edited at {edited_info.get('ts')}. Checking if original timestamp is usable.")
+                # If the message timestamp is more than 1 hour old, use current time instead
+                if now - base_ts > EDITED_MESSAGE_MAX_AGE_SECONDS:
+                    print(f"Original message timestamp is too old ({base_ts}), using current time ({now}) as base for scheduling")
+                    base_ts = now
+            
+            # Find first reminder slot (next available business hour)
+            # Use the scheduling module to calculate proper 2-day window
+            schedule_times = calculate_initial_schedule(base_ts, now, SCHEDULING_CONFIG)
+            
+            # React to confirm we received it (returns False if already reacted = duplicate). This runs before
+            # any lookup so a duplicate delivery makes no further Slack calls.
+            if not _add_check_mark(channel, message_ts):
+                print(f"Already processed (checkmark reaction failed with already_reacted), skipping")
+                return
+            
+            # A first delivery is guarded by the check mark, so only an edited mention (re-sent after the
+            # mark was removed) can already have reminders. The lookup stops at the last planned slot
+            # since nothing later can collide.
+            existing_times = set()
+            if schedule_times and edited_info:
+                nudges, _ = _list_scheduled_nudges(channel, {message_ts}, latest=max(schedule_times))
+                existing_times = _get_existing_scheduled_times_for_thread(channel, message_ts, nudges)
+            
+            # Drop slots that already have a reminder, then schedule the rest concurrently
+            to_schedule = [post_at for post_at in schedule_times if post_at not in existing_times]
+            if len(to_schedule) < len(schedule_times):
+                print(f"Skipping {len(schedule_times) - len(to_schedule)} duplicate reminder(s) already scheduled")
+            _run_concurrently(
+                lambda post_at: _schedule_nudge(channel, message_ts, post_at, message_ts, pr_url),
+                to_schedule
+            )
+            
+            print(f"Scheduled {len(to_schedule)} reminders for PR: {pr_url}")
+            
+        except SlackApiError as e:
+            # If already_reacted, it means we already processed this (retry/duplicate)
+            if _is_already_reacted(e.response.get("error")):
+                print(f"Already processed this message (already_reacted), skipping")
+                return
+            
+            print(f"schedule failed: {e}")
+            # Try to react with error indicator
+            try:
+                client.reactions_add(
+                    channel=channel,
+                    timestamp=message_ts,
+                    name="x"
+                )
+            except:
+                pass
+    
+    elif channel and message_ts:
+        # No PR link found - react with question mark
+        try:
+            client.reactions_add(
+                channel=channel,
+                timestamp=message_ts,
+                name="question"
+            )
+        except SlackApiError as e:
+            if _is_already_reacted(e.response.get("error")):
+                print(f"Already processed (reaction exists), skipping")
+            # Silently ignore other reaction errors
+        except:
+            pass
+
+# Cancel pending reminders on :approved: reaction
+
+def _handle_reaction_added(ev: dict):
+    """Cancel pending reminders on :approved: reaction"""
+    if ev.get("reaction") == "approved":
+        item = ev.get("item", {})
+        if item.get("type") == "message":
+            channel = item.get("channel")
+            original_ts = item.get("ts")
+            if channel and original_ts:
+                try:
+                    _delete_scheduled_nudges_for_thread(channel, original_ts)
+                except SlackApiError as e:
+                    print(f"delete scheduled error: {e}")
+
+# Slack event type -> handler; other event types are acknowledged and ignored
+_EVENT_HANDLERS = {
+    "app_mention": _handle_app_mention,
+    "reaction_added": _handle_reaction_added,
+}
+
+def lambda_handler(event, context):
+    global _slack_deadline
+    # EventBridge scheduled top-up branch; its fixed-shape event is not worth dumping
     if event.get("source") == "aws.events":
         try:
-            _top_up_all_channels()
+            print(f"Top-up finished: {_top_up_all_channels()}")
         except SlackApiError as e:
             print(f"top-up error: {e}")
         return {"statusCode": 200, "body": ""}
+    
+    _slack_deadline = time.monotonic() + SLACK_ACK_SECONDS
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Received event: %s", _json_dumps(event))
 
     # Slack Events via API Gateway HTTP API
     body = event.get("body") or ""
+    if event.get("isBase64Encoded"):
+        # API Gateway hands over the raw bytes; sign and parse them without a str round trip
+        body = base64.b64decode(body)
     headers = event.get("headers", {})
-    print(f"Body length: {len(body)}, Headers: {list(headers.keys())}")  # Debug logging
+    logger.debug("Body length: %d, Headers: %s", len(body), headers.keys())
 
     if not _verify_slack_signature(headers, body):
         print("Signature verification failed!")  # Debug logging
         return {"statusCode": 403, "body": "invalid signature"}
 
-    payload = json.loads(body)
-    print(f"Payload type: {payload.get('type')}, Event type: {payload.get('event', {}).get('type')}")  # Debug logging
+    # Single-flight: skip timeout redeliveries before re-listing scheduled messages
+    if _is_timeout_retry(headers):
+        print(f"Slack retry {headers.get('x-slack-retry-num') or headers.get('X-Slack-Retry-Num')} after http_timeout, skipping")
+        return {"statusCode": 200, "body": ""}
+
+    payload = _json_loads(body)
+    logger.debug("Payload type: %s, Event type: %s", payload.get("type"), payload.get("event", {}).get("type"))
     
     # Idempotency check - deduplicate retries using event_id
     event_id = payload.get("event_id")
-    if event_id and event_id in _processed_events:
+    if event_id and _is_duplicate_event(event_id):
         print(f"Event {event_id} already processed, skipping duplicate")
         return {"statusCode": 200, "body": ""}
-    if event_id:
-        _processed_events.add(event_id)
-        # Keep only last 1000 event IDs to prevent unbounded memory growth
-        if len(_processed_events) > 100:
-            _processed_events.pop()
 
     # URL verification handshake
     if payload.get("type") == "url_verification":
@@ -290,180 +663,9 @@ def lambda_handler(event, context):
     # Event callback handling
     if payload.get("type") == "event_callback":
         ev = payload.get("event", {})
-        etype = ev.get("type")
-
-        # Handle app mentions (when users @mention the bot with PR links)
-        if etype == "app_mention":
-            channel = ev.get("channel")
-            message_ts = ev.get("ts")
-            text = ev.get("text", "")
-            thread_ts = ev.get("thread_ts")  # Present if this is a thread reply
-            
-            print(f"app_mention event - Channel: {channel}, Text: {text}, Thread: {thread_ts}")  # Debug logging
-            
-            # Check if this is a thread reply requesting cancellation
-            if thread_ts and thread_ts != message_ts:
-                # This is a reply in a thread (not the parent message)
-                print(f"Detected thread reply, checking for cancellation request")
-                
-                # Check if message contains :approved: emoji
-                if ":approved:" in text or "approved" in text.lower():
-                    print(f"Found approval indicator, checking if parent has PR reminders")
-                    
-                    # Check if the parent message has scheduled reminders
-                    try:
-                        marker_prefix = f"[PR-NUDGE ch={channel} ts={thread_ts}"
-                        has_reminders = False
-                        
-                        # Quick check if this thread has any scheduled messages
-                        resp = client.chat_scheduledMessages_list(channel=channel, limit=100)
-                        for item in resp.get("scheduled_messages", []):
-                            if marker_prefix in (item.get("text") or ""):
-                                has_reminders = True
-                                break
-                        
-                        if has_reminders:
-                            print(f"Parent message has reminders, cancelling all scheduled messages")
-                            _delete_scheduled_nudges_for_thread(channel, thread_ts)
-                            
-                            # React to confirm cancellation
-                            _add_check_mark(channel, message_ts)
-                            print(f"Successfully cancelled reminders for thread {thread_ts}")
-                            return {"statusCode": 200, "body": ""}
-                        else:
-                            print(f"No reminders found for thread {thread_ts}")
-                            
-                            if(_is_check_mark_reacted(channel, message_ts)):
-                                print(f"Already processed successfully (✅ exists), skipping ❓")
-                                return {"statusCode": 200, "body": ""}
-                            
-                            # Genuinely no reminders found - react with question mark
-                            try:
-                                client.reactions_add(
-                                    channel=channel,
-                                    timestamp=message_ts,
-                                    name="question"
-                                )
-                            except SlackApiError as reaction_err:
-                                if _is_already_reacted(reaction_err.response.get("error")):
-                                    print(f"Already processed (reaction exists), skipping")
-                                else:
-                                    raise
-                            return {"statusCode": 200, "body": ""}
-                    
-                    except SlackApiError as e:
-                        print(f"Error checking/cancelling reminders: {e}")
-                        # React with X to indicate error (unless already reacted)
-                        if _is_already_reacted(e.response.get("error")):
-                            try:
-                                client.reactions_add(
-                                    channel=channel,
-                                    timestamp=message_ts,
-                                    name="x"
-                                )
-                            except:
-                                pass
-                        return {"statusCode": 200, "body": ""}
-            
-            # Original logic: Extract PR URLs from text (works with both plain URLs and markdown links)
-            pr_match = PR_RE.search(text)
-            
-            # Reject PR links posted in threads (not as parent message)
-            if pr_match and thread_ts and thread_ts != message_ts:
-                print(f"PR link found in thread reply - rejecting. PR reminders must be created on parent messages, not in threads.")
-                try:
-                    client.reactions_add(
-                        channel=channel,
-                        timestamp=message_ts,
-                        name="x"
-                    )
-                except SlackApiError as e:
-                    if not _is_already_reacted(e.response.get("error")):
-                        print(f"Failed to add :x: reaction: {e}")
-                return {"statusCode": 200, "body": ""}
-            
-            if pr_match and channel and message_ts:
-                pr_url = pr_match.group(0)
-                print(f"Found PR URL: {pr_url}")
-                
-                try:
-                    # React to confirm we received it (returns False if already reacted = duplicate)
-                    if not _add_check_mark(channel, message_ts):
-                        print(f"Already processed (checkmark reaction failed with already_reacted), skipping")
-                        return {"statusCode": 200, "body": ""}
-                    
-                    # Schedule reminders for this message using interval-based logic
-                    # If message was edited and the original timestamp is too old, use current time as base
-                    now = time.time()
-                    edited_info = ev.get("edited")
-                    base_ts = float(message_ts)
-                    
-                    # Check if message was edited and if original timestamp would cause past scheduling
-                    if edited_info:
-                        print(f"Message was edited at {edited_info.get('ts')}. Checking if original timestamp is usable.")
-                        # If the message timestamp is more than 1 hour old, use current time instead
-                        if now - base_ts > 3600:  # 1 hour
-                            print(f"Original message timestamp is too old ({base_ts}), using current time ({now}) as base for scheduling")
-                            base_ts = now
-                    
-                    existing_times = _get_existing_scheduled_times_for_thread(channel, message_ts)
-                    
-                    # Find first reminder slot (next available business hour)
-                    # Use the scheduling module to calculate proper 2-day window
-                    schedule_times = calculate_initial_schedule(base_ts, now, SCHEDULING_CONFIG)
-                    
-                    # Schedule all calculated reminders
-                    reminder_count = 0
-                    for cursor_time in schedule_times:
-                        if _schedule_nudge_if_not_exists(channel, message_ts, cursor_time, message_ts, existing_times, pr_url):
-                            reminder_count += 1
-                    
-                    print(f"Scheduled {reminder_count} reminders for PR: {pr_url}")
-                    
-                except SlackApiError as e:
-                    # If already_reacted, it means we already processed this (retry/duplicate)
-                    if _is_already_reacted(e.response.get("error")):
-                        print(f"Already processed this message (already_reacted), skipping")
-                        return {"statusCode": 200, "body": ""}
-                    
-                    print(f"schedule failed: {e}")
-                    # Try to react with error indicator
-                    try:
-                        client.reactions_add(
-                            channel=channel,
-                            timestamp=message_ts,
-                            name="x"
-                        )
-                    except:
-                        pass
-            
-            elif channel and message_ts:
-                # No PR link found - react with question mark
-                try:
-                    client.reactions_add(
-                        channel=channel,
-                        timestamp=message_ts,
-                        name="question"
-                    )
-                except SlackApiError as e:
-                    if _is_already_reacted(e.response.get("error")):
-                        print(f"Already processed (reaction exists), skipping")
-                    # Silently ignore other reaction errors
-                except:
-                    pass
-
-        # Cancel pending reminders on :approved: reaction
-        elif etype == "reaction_added":
-            if ev.get("reaction") == "approved":
-                item = ev.get("item", {})
-                if item.get("type") == "message":
-                    channel = item.get("channel")
-                    original_ts = item.get("ts")
-                    if channel and original_ts:
-                        try:
-                            _delete_scheduled_nudges_for_thread(channel, original_ts)
-                        except SlackApiError as e:
-                            print(f"delete scheduled error: {e}")
+        handle = _EVENT_HANDLERS.get(ev.get("type"))
+        if handle:
+            handle(ev)
 
     return {"statusCode": 200, "body": ""}
 
@@ -2,10 +2,32 @@
 Pure business logic for PR reminder scheduling.
 This module contains no dependencies on Slack API or AWS services.
 """
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import date, datetime
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 
 
+# Days to add to reach Monday from each weekday (Mon=0 ... Sun=6); zero on business days
+_WEEKEND_SKIP = (0, 0, 0, 0, 0, 2, 1)
+
+# Calendar days from each weekday (Mon=0 ... Sun=6) to the n-th business day after it, n = 0..5
+_BUSINESS_DAYS_AHEAD = (
+    (0, 1, 2, 3, 4, 7),  # Mon
+    (0, 1, 2, 3, 6, 7),  # Tue
+    (0, 1, 2, 5, 6, 7),  # Wed
+    (0, 1, 4, 5, 6, 7),  # Thu
+    (0, 3, 4, 5, 6, 7),  # Fri
+    (0, 2, 3, 4, 5, 6),  # Sat
+    (0, 1, 2, 3, 4, 5),  # Sun
+)
+
+# UTC offsets are looked up per 15-minute bucket of epoch time
+_OFFSET_BUCKET_SECONDS = 900
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
 class SchedulingConfig:
     """Configuration for scheduling logic"""
     def __init__(
@@ -23,6 +45,156 @@ class SchedulingConfig:
         self.timezone = ZoneInfo(timezone_str)
 
 
+@lru_cache(maxsize=4096)
+def _bucket_utc_offset(bucket: int, tz: ZoneInfo) -> int | None:
+    """
+    UTC offset in seconds shared by a whole offset bucket, or None if a
+    transition falls inside the bucket and the offset has to be looked up exactly.
+    """
+    start = bucket * _OFFSET_BUCKET_SECONDS
+    first = datetime.fromtimestamp(start, tz=tz).utcoffset()
+    last = datetime.fromtimestamp(start + _OFFSET_BUCKET_SECONDS - 1, tz=tz).utcoffset()
+    return int(first.total_seconds()) if first == last else None
+
+
+def _utc_offset(epoch: int, tz: ZoneInfo) -> int:
+    """UTC offset in seconds of tz at a whole-second epoch"""
+    offset = _bucket_utc_offset(epoch // _OFFSET_BUCKET_SECONDS, tz)
+    if offset is None:
+        offset = int(datetime.fromtimestamp(epoch, tz=tz).utcoffset().total_seconds())
+    return offset
+
+
+def _whole_seconds(epoch: float) -> int:
+    """Truncate an epoch to whole seconds the way datetime does (after rounding to microseconds)"""
+    seconds = int(epoch)
+    if round((epoch - seconds) * 1e6) >= 1_000_000:
+        seconds += 1
+    return seconds
+
+
+def _wall_to_epoch(wall: int, tz: ZoneInfo) -> int:
+    """
+    UTC epoch of a local wall-clock time given as seconds since the local epoch.
+    Resolves DST gaps and repeated hours the same way datetime does (fold=0).
+    """
+    offset = _utc_offset(wall - 86400, tz)
+    if offset == _utc_offset(wall + 86400, tz):
+        return wall - offset
+    # Near a transition - let zoneinfo resolve it
+    days, seconds = divmod(wall, 86400)
+    day = date.fromordinal(_EPOCH_ORDINAL + days)
+    local = datetime(day.year, day.month, day.day, seconds // 3600, seconds // 60 % 60, seconds % 60, tzinfo=tz)
+    return int(local.timestamp())
+
+
+def _is_business_slot(weekday: int, hour: int, start: int, end: int) -> bool:
+    """Business-hours rule on already extracted local fields (weekday Mon=0 ... Sun=6)"""
+    return weekday < 5 and start <= hour < end
+
+
+def _is_business_epoch(epoch: int, config: SchedulingConfig) -> bool:
+    """Epoch equivalent of is_within_business_hours, using integer arithmetic on local seconds"""
+    local = epoch + _utc_offset(epoch, config.timezone)
+    return _is_business_slot(
+        (local // 86400 + _EPOCH_WEEKDAY) % 7, local // 3600 % 24,
+        config.business_hours_start, config.business_hours_end
+    )
+
+
+@lru_cache(maxsize=4096)
+def _next_reminder_epoch(seconds: int, interval_hours: int, start: int, end: int, tz: ZoneInfo) -> int:
+    """
+    next_reminder_in_business_hours on whole-second epochs and plain config values.
+    Cached because threads rolled over to the same business-hours start share every later step.
+    """
+    # Add the interval in local wall-clock time
+    offset = _utc_offset(seconds, tz)
+    wall = seconds + offset + interval_hours * 3600
+    days, local_seconds = divmod(wall, 86400)
+    weekday = (days + _EPOCH_WEEKDAY) % 7
+    hour = local_seconds // 3600
+    
+    if _is_business_slot(weekday, hour, start, end):
+        # Fast path: with the same offset at both ends the epoch sum lands on the same wall time,
+        # and it cannot be the repeated copy of an hour since clocks never go back by a whole interval
+        candidate = seconds + interval_hours * 3600
+        if _utc_offset(candidate, tz) == offset:
+            return candidate
+        return _wall_to_epoch(wall, tz)
+    
+    # Outside business hours: roll to business hours start, same day only if it is
+    # a weekday before opening, otherwise the next business day (skipping weekends)
+    if weekday >= 5 or hour >= end:
+        days += 1
+        days += _WEEKEND_SKIP[(days + _EPOCH_WEEKDAY) % 7]
+    return _wall_to_epoch(days * 86400 + start * 3600, tz)
+
+
+@lru_cache(maxsize=256)
+def _next_business_slot_epoch(seconds: int, interval_hours: int, start: int, end: int, tz: ZoneInfo) -> int:
+    """
+    next_business_hour_slot_from_epoch on whole-second epochs and plain config values.
+    Cached because the same PR timestamps are planned repeatedly (retries, edits, top-ups).
+    """
+    days, local_seconds = divmod(seconds + _utc_offset(seconds, tz), 86400)
+    weekday = (days + _EPOCH_WEEKDAY) % 7
+    hour = local_seconds // 3600
+    
+    # If within business hours on a weekday, calculate next interval slot
+    if _is_business_slot(weekday, hour, start, end):
+        return _next_reminder_epoch(seconds, interval_hours, start, end, tz)
+    
+    # Outside business hours or weekend - find next business day start.
+    # If before business hours today and it's a weekday, use today,
+    # otherwise move to next business day, skipping weekends in one step
+    if not (weekday < 5 and hour < start):
+        days += 1
+        days += _WEEKEND_SKIP[(days + _EPOCH_WEEKDAY) % 7]
+    
+    return _wall_to_epoch(days * 86400 + start * 3600, tz)
+
+
+def _add_business_days(days: int, n: int) -> int:
+    """Local day (days since the epoch) n business days after the given one, in O(1)"""
+    if n <= 0:
+        return days
+    # Whole weeks add five business days each; the table covers the remaining one to five
+    weeks, remainder = divmod(n - 1, 5)
+    return days + weeks * 7 + _BUSINESS_DAYS_AHEAD[(days + _EPOCH_WEEKDAY) % 7][remainder + 1]
+
+
+@lru_cache(maxsize=64)
+def _window_target_for_day(days: int, window_size: int, business_hours_end: int, tz: ZoneInfo) -> int:
+    """
+    End of business hours window_size business days after a local day (days since the epoch).
+    Cached per local day, so every PR planned on the same day shares one computation.
+    """
+    days = _add_business_days(days, window_size)
+    return _wall_to_epoch(days * 86400 + business_hours_end * 3600, tz)
+
+
+def calculate_window_target(now_timestamp: float, config: SchedulingConfig) -> int:
+    """
+    Last moment reminders may be scheduled for: end of business hours WINDOW_SIZE business days from now.
+    
+    Args:
+        now_timestamp: Current time (UTC epoch)
+        config: Scheduling configuration
+    
+    Returns:
+        Window target timestamp (UTC epoch)
+    """
+    seconds = _whole_seconds(now_timestamp)
+    days = (seconds + _utc_offset(seconds, config.timezone)) // 86400
+    return _window_target_for_day(days, config.window_size, config.business_hours_end, config.timezone)
+
+
+def format_local_time(epoch_utc: int, config: SchedulingConfig, fmt: str = "%Y-%m-%d %H:%M") -> str:
+    """Format a UTC epoch as local time for log lines, without building datetime objects"""
+    return time.strftime(fmt, time.gmtime(epoch_utc + _utc_offset(epoch_utc, config.timezone)))
+
+
 def is_within_business_hours(dt_local: datetime, config: SchedulingConfig) -> bool:
     """
     Check if a datetime is within business hours (Mon-Fri, 9am-5pm by default).
@@ -34,10 +206,7 @@ def is_within_business_hours(dt_local: datetime, config: SchedulingConfig) -> bo
     Returns:
         True if within business hours, False otherwise
     """
-    if dt_local.weekday() >= 5:  # Weekend
-        return False
-    hour = dt_local.hour
-    return config.business_hours_start <= hour < config.business_hours_end
+    return _is_business_slot(dt_local.weekday(), dt_local.hour, config.business_hours_start, config.business_hours_end)
 
 
 def next_reminder_in_business_hours(
@@ -57,30 +226,10 @@ def next_reminder_in_business_hours(
     Returns:
         Next valid reminder timestamp (UTC epoch)
     """
-    from_dt_utc = datetime.fromtimestamp(from_epoch, tz=timezone.utc)
-    from_dt_local = from_dt_utc.astimezone(config.timezone)
-    
-    # Add the interval
-    target_dt_local = from_dt_local + timedelta(hours=interval_hours)
-    
-    # If target falls outside business hours or on weekend, roll to next business day start
-    while not is_within_business_hours(target_dt_local, config):
-        # If past end of business hours or on weekend, move to next day at start hour
-        if target_dt_local.weekday() >= 5 or target_dt_local.hour >= config.business_hours_end:
-            # Move to next day
-            target_dt_local = (target_dt_local + timedelta(days=1)).replace(
-                hour=config.business_hours_start, minute=0, second=0, microsecond=0
-            )
-        elif target_dt_local.hour < config.business_hours_start:
-            # Before business hours, move to start of business hours same day
-            target_dt_local = target_dt_local.replace(
-                hour=config.business_hours_start, minute=0, second=0, microsecond=0
-            )
-        else:
-            # Should not reach here, but break just in case
-            break
-    
-    return int(target_dt_local.astimezone(timezone.utc).timestamp())
+    return _next_reminder_epoch(
+        _whole_seconds(from_epoch), interval_hours,
+        config.business_hours_start, config.business_hours_end, config.timezone
+    )
 
 
 def next_business_hour_slot_from_epoch(epoch_utc: float, config: SchedulingConfig) -> int:
@@ -96,26 +245,10 @@ def next_business_hour_slot_from_epoch(epoch_utc: float, config: SchedulingConfi
     Returns:
         Next business hour slot timestamp (UTC epoch)
     """
-    utc_dt = datetime.fromtimestamp(epoch_utc, tz=timezone.utc)
-    local = utc_dt.astimezone(config.timezone)
-    
-    # If within business hours on a weekday, calculate next interval slot
-    if is_within_business_hours(local, config):
-        return next_reminder_in_business_hours(epoch_utc, config.reminder_interval_hours, config)
-    
-    # Outside business hours or weekend - find next business day start
-    target = local.replace(hour=config.business_hours_start, minute=0, second=0, microsecond=0)
-    
-    # If before business hours today and it's a weekday, use today
-    if local.weekday() < 5 and local.hour < config.business_hours_start:
-        return int(target.astimezone(timezone.utc).timestamp())
-    
-    # Otherwise move to next business day
-    target += timedelta(days=1)
-    while target.weekday() >= 5:  # Skip weekends
-        target += timedelta(days=1)
-    
-    return int(target.astimezone(timezone.utc).timestamp())
+    return _next_business_slot_epoch(
+        _whole_seconds(epoch_utc), config.reminder_interval_hours,
+        config.business_hours_start, config.business_hours_end, config.timezone
+    )
 
 
 def calculate_initial_schedule(
@@ -138,19 +271,7 @@ def calculate_initial_schedule(
     schedule = []
     
     # Calculate target: WINDOW_SIZE business days from now
-    now_dt = datetime.fromtimestamp(now_timestamp, tz=timezone.utc).astimezone(config.timezone)
-    target_dt = now_dt
-    days_added = 0
-    while days_added < config.window_size:
-        target_dt += timedelta(days=1)
-        if target_dt.weekday() < 5:  # Mon-Fri only
-            days_added += 1
-    target_timestamp = int(target_dt.replace(
-        hour=config.business_hours_end,
-        minute=0,
-        second=0,
-        microsecond=0
-    ).timestamp())
+    target_timestamp = calculate_window_target(now_timestamp, config)
     
     # Schedule reminders at interval until we reach target
     cursor_time = next_business_hour_slot_from_epoch(pr_timestamp, config)
@@ -169,7 +290,8 @@ def calculate_topup_schedule(
     existing_schedule: list[int] | list[float],
     now_timestamp: float,
     pr_timestamp: float,
-    config: SchedulingConfig
+    config: SchedulingConfig,
+    target_timestamp: int | None = None
 ) -> list[int]:
     """
     Calculate what new reminders to add during EventBridge top-up.
@@ -179,36 +301,24 @@ def calculate_topup_schedule(
         now_timestamp: Current time when top-up runs (UTC epoch)
         pr_timestamp: Original PR timestamp (UTC epoch)
         config: Scheduling configuration
+        target_timestamp: Precomputed calculate_window_target(now_timestamp, config), shared across threads
     
     Returns:
         List of new reminder timestamps to add (UTC epoch)
     """
-    # Filter out reminders that have already fired
-    remaining = [t for t in existing_schedule if t > now_timestamp]
-    remaining.sort()
+    # Only the latest reminder that has not fired yet matters; new ones chain from it
+    latest = max((t for t in existing_schedule if t > now_timestamp), default=None)
     
     # Calculate target: WINDOW_SIZE business days from now
-    now_dt = datetime.fromtimestamp(now_timestamp, tz=timezone.utc).astimezone(config.timezone)
-    target_dt = now_dt
-    days_added = 0
-    while days_added < config.window_size:
-        target_dt += timedelta(days=1)
-        if target_dt.weekday() < 5:  # Mon-Fri only
-            days_added += 1
-    target_timestamp = int(target_dt.replace(
-        hour=config.business_hours_end,
-        minute=0,
-        second=0,
-        microsecond=0
-    ).timestamp())
+    if target_timestamp is None:
+        target_timestamp = calculate_window_target(now_timestamp, config)
     
     # Add new reminders until we reach target
     new_reminders = []
-    post_ats = remaining.copy()
     
-    while not post_ats or post_ats[-1] < target_timestamp:
-        if post_ats:
-            base = post_ats[-1]
+    while latest is None or latest < target_timestamp:
+        if latest is not None:
+            base = latest
         else:
             # No existing schedule, start from PR time
             base = next_business_hour_slot_from_epoch(pr_timestamp, config)
@@ -223,7 +333,7 @@ def calculate_topup_schedule(
         if next_reminder > target_timestamp:
             break
         
-        post_ats.append(next_reminder)
+        latest = next_reminder
         new_reminders.append(next_reminder)
     
     return new_reminders
@@ -20,8 +20,10 @@ cp "$SCRIPT_DIR/../src/scheduling.py" "$BUILD_DIR/"
 cp "$SCRIPT_DIR/../src/requirements.txt" "$BUILD_DIR/"
 
 # Install dependencies
+# orjson is compiled, so fetch wheels for the Lambda runtime (python3.12, x86_64) rather than the build host
 echo "Installing dependencies..."
-pip install -r "$BUILD_DIR/requirements.txt" -t "$BUILD_DIR" --quiet
+pip install -r "$BUILD_DIR/requirements.txt" -t "$BUILD_DIR" --quiet \
+    --platform manylinux2014_x86_64 --python-version 3.12 --implementation cp --only-binary=:all:
 
 # Remove unnecessary files to reduce package size
 rm -rf "$BUILD_DIR"/*.dist-info
@@ -3,13 +3,9 @@ Unit tests for scheduling logic.
 Run with: pytest tests/test_scheduling.py -v
 """
 import pytest
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
-import sys
-import os
-
-# Add src to path for imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from scheduling import (
     SchedulingConfig,
@@ -20,10 +16,42 @@ from scheduling import (
     calculate_topup_schedule
 )
 
+# Resolved once for the module; ZoneInfo instances are immutable
+MEL_TZ = ZoneInfo("Australia/Melbourne")
 
-@pytest.fixture
+
+@lru_cache(maxsize=None)
+def _ep(year: int, month: int, day: int, hour: int, minute: int = 0) -> float:
+    """UTC epoch for a Melbourne wall-clock time; the same few times recur across tests"""
+    return datetime(year, month, day, hour, minute, tzinfo=MEL_TZ).timestamp()
+
+
+def _epochs(*local_times: tuple[int, int, int]) -> tuple[float, ...]:
+    """UTC epochs for (day, hour, minute) Melbourne times in January 2026"""
+    return tuple(_ep(2026, 1, day, hour, minute) for day, hour, minute in local_times)
+
+
+def _local(epochs) -> list[str]:
+    """Readable Melbourne times for assertion messages"""
+    return [datetime.fromtimestamp(t, tz=MEL_TZ).strftime('%a %d %b %H:%M') for t in epochs]
+
+
+# Expected reminders for a PR posted Monday 19 Jan 2026 12:05 with the default config, computed once
+PR_MONDAY_1205 = _ep(2026, 1, 19, 12, 5)
+MONDAY_INITIAL_SCHEDULE = _epochs(
+    (19, 15, 5),                           # Monday 15:05
+    (20, 9, 0), (20, 12, 0), (20, 15, 0),  # Tuesday
+    (21, 9, 0), (21, 12, 0), (21, 15, 0),  # Wednesday
+)
+THURSDAY_TOPUP = _epochs((22, 9, 0), (22, 12, 0), (22, 15, 0))  # Added by the Tuesday 11:05 top-up
+FRIDAY_TOPUP = _epochs((23, 9, 0), (23, 12, 0), (23, 15, 0))    # Added by the Wednesday 11:05 top-up
+# What is still pending going into Wednesday's top-up: Tuesday 12:00 onwards plus Tuesday's additions
+TUESDAY_SCHEDULE = MONDAY_INITIAL_SCHEDULE[2:] + THURSDAY_TOPUP
+
+
+@pytest.fixture(scope="session")
 def default_config():
-    """Default scheduling configuration"""
+    """Default scheduling configuration (shared; no test mutates it)"""
     return SchedulingConfig(
         reminder_interval_hours=3,
         business_hours_start=9,
@@ -36,7 +64,7 @@ def default_config():
 @pytest.fixture
 def mel_tz():
     """Melbourne timezone"""
-    return ZoneInfo("Australia/Melbourne")
+    return MEL_TZ
 
 
 class TestIsWithinBusinessHours:
@@ -62,16 +90,28 @@ class TestIsWithinBusinessHours:
         dt = datetime(2026, 1, 18, 10, 0, tzinfo=mel_tz)  # Saturday 10am
         assert is_within_business_hours(dt, default_config) is False
     
-    @pytest.mark.parametrize("hour,expected", [
-        (9, True),   # Start of business hours
-        (12, True),  # Midday
-        (16, True),  # 4pm
-        (17, False), # End of business hours (exclusive)
-    ])
-    def test_boundary_hours(self, hour, expected, default_config, mel_tz):
+    def test_boundary_hours(self, default_config, mel_tz):
         """Test boundary conditions"""
-        dt = datetime(2026, 1, 19, hour, 0, tzinfo=mel_tz)  # Monday
-        assert is_within_business_hours(dt, default_config) is expected
+        for hour, expected in [
+            (9, True),   # Start of business hours
+            (12, True),  # Midday
+            (16, True),  # 4pm
+            (17, False), # End of business hours (exclusive)
+        ]:
+            dt = datetime(2026, 1, 19, hour, 0, tzinfo=mel_tz)  # Monday
+            assert is_within_business_hours(dt, default_config) is expected, hour
+
+    @pytest.mark.parametrize("start", [
+        datetime(2026, 4, 1, tzinfo=MEL_TZ),   # DST ends Sunday 5 April
+        datetime(2026, 10, 1, tzinfo=MEL_TZ),  # DST starts Sunday 4 October
+    ])
+    def test_epoch_check_matches_datetime_check(self, start, default_config, mel_tz):
+        """Epoch-based check should agree with the datetime check across DST changes"""
+        from scheduling import _is_business_epoch
+        base = int(start.timestamp())
+        for epoch in range(base, base + 7 * 86400, 900):
+            dt = datetime.fromtimestamp(epoch, tz=mel_tz)
+            assert _is_business_epoch(epoch, default_config) is is_within_business_hours(dt, default_config)
 
 
 class TestNextReminderInBusinessHours:
@@ -83,10 +123,8 @@ class TestNextReminderInBusinessHours:
         from_epoch = dt.timestamp()
         
         result = next_reminder_in_business_hours(from_epoch, 3, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 13  # 1pm
-        assert result_dt.day == 19
+        assert result == _ep(2026, 1, 19, 13)  # Monday 1pm
     
     def test_rolls_to_next_day(self, default_config, mel_tz):
         """4pm + 3 hours = 9am next business day"""
@@ -94,10 +132,8 @@ class TestNextReminderInBusinessHours:
         from_epoch = dt.timestamp()
         
         result = next_reminder_in_business_hours(from_epoch, 3, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 9
-        assert result_dt.day == 20  # Tuesday
+        assert result == _ep(2026, 1, 20, 9)  # Tuesday 9am
     
     def test_friday_rolls_to_monday(self, default_config, mel_tz):
         """Friday 4pm + 3 hours = Monday 9am"""
@@ -105,11 +141,35 @@ class TestNextReminderInBusinessHours:
         from_epoch = dt.timestamp()
         
         result = next_reminder_in_business_hours(from_epoch, 3, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 9
-        assert result_dt.day == 26  # Monday
-        assert result_dt.weekday() == 0
+        assert result == _ep(2026, 1, 26, 9)  # Monday 9am
+
+    def test_weekend_rollover_across_dst_start(self, default_config, mel_tz):
+        """Friday 4pm + 3 hours over the DST weekend = Monday 9am daylight time"""
+        dt = datetime(2026, 10, 2, 16, 0, tzinfo=mel_tz)  # Friday before DST starts
+        from_epoch = dt.timestamp()
+
+        result = next_reminder_in_business_hours(from_epoch, 3, default_config)
+
+        assert result == int(_ep(2026, 10, 5, 9))
+
+    @pytest.mark.parametrize("day", range(19, 26))  # Monday 19 Jan to Sunday 25 Jan 2026
+    def test_matches_day_by_day_rollover(self, day, default_config, mel_tz):
+        """Closed-form rollover should match stepping one day at a time until business hours"""
+        for hour in range(24):
+            for minute in (0, 30):
+                from_dt = datetime(2026, 1, day, hour, minute, tzinfo=mel_tz)
+                target = from_dt + timedelta(hours=3)
+                if not is_within_business_hours(target, default_config):
+                    if target.weekday() < 5 and target.hour < default_config.business_hours_start:
+                        target = target.replace(hour=default_config.business_hours_start, minute=0)
+                    else:
+                        target = (target + timedelta(days=1)).replace(hour=default_config.business_hours_start, minute=0)
+                        while target.weekday() >= 5:
+                            target += timedelta(days=1)
+
+                result = next_reminder_in_business_hours(from_dt.timestamp(), 3, default_config)
+                assert result == int(target.timestamp()), f"{from_dt:%a %H:%M}"
 
 
 class TestNextBusinessHourSlotFromEpoch:
@@ -121,11 +181,8 @@ class TestNextBusinessHourSlotFromEpoch:
         epoch = dt.timestamp()
         
         result = next_business_hour_slot_from_epoch(epoch, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 15
-        assert result_dt.minute == 5
-        assert result_dt.day == 19
+        assert result == _ep(2026, 1, 19, 15, 5)  # Monday 3:05pm
     
     def test_after_hours(self, default_config, mel_tz):
         """Monday 6pm should return Tuesday 9am"""
@@ -133,11 +190,8 @@ class TestNextBusinessHourSlotFromEpoch:
         epoch = dt.timestamp()
         
         result = next_business_hour_slot_from_epoch(epoch, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 9
-        assert result_dt.minute == 0
-        assert result_dt.day == 20  # Tuesday
+        assert result == _ep(2026, 1, 20, 9)  # Tuesday 9am
     
     def test_weekend(self, default_config, mel_tz):
         """Saturday should return Monday 9am"""
@@ -145,40 +199,18 @@ class TestNextBusinessHourSlotFromEpoch:
         epoch = dt.timestamp()
         
         result = next_business_hour_slot_from_epoch(epoch, default_config)
-        result_dt = datetime.fromtimestamp(result, tz=mel_tz)
         
-        assert result_dt.hour == 9
-        assert result_dt.day == 19  # Monday
-        assert result_dt.weekday() == 0
+        assert result == _ep(2026, 1, 19, 9)  # Monday 9am
 
 
 class TestCalculateInitialSchedule:
     """Tests for calculate_initial_schedule function"""
     
-    def test_monday_1205pm_schedule(self, default_config, mel_tz):
+    def test_monday_1205pm_schedule(self, default_config):
         """PR on Monday 12:05pm should create correct schedule"""
-        pr_dt = datetime(2026, 1, 19, 12, 5, tzinfo=mel_tz)
-        pr_epoch = pr_dt.timestamp()
-        
-        schedule = calculate_initial_schedule(pr_epoch, pr_epoch, default_config)
+        schedule = calculate_initial_schedule(PR_MONDAY_1205, PR_MONDAY_1205, default_config)
         
-        # Convert to datetimes for easier assertion
-        schedule_dts = [datetime.fromtimestamp(t, tz=mel_tz) for t in schedule]
-        
-        expected = [
-            datetime(2026, 1, 19, 15, 5, tzinfo=mel_tz),   # Monday 15:05
-            datetime(2026, 1, 20, 9, 0, tzinfo=mel_tz),    # Tuesday 09:00
-            datetime(2026, 1, 20, 12, 0, tzinfo=mel_tz),   # Tuesday 12:00
-            datetime(2026, 1, 20, 15, 0, tzinfo=mel_tz),   # Tuesday 15:00
-            datetime(2026, 1, 21, 9, 0, tzinfo=mel_tz),    # Wednesday 09:00
-            datetime(2026, 1, 21, 12, 0, tzinfo=mel_tz),   # Wednesday 12:00
-            datetime(2026, 1, 21, 15, 0, tzinfo=mel_tz),   # Wednesday 15:00
-        ]
-        
-        assert len(schedule_dts) == len(expected), f"Expected {len(expected)} reminders, got {len(schedule_dts)}"
-        
-        for i, (actual, exp) in enumerate(zip(schedule_dts, expected)):
-            assert actual == exp, f"Reminder {i+1}: expected {exp.strftime('%A %d %b %H:%M')}, got {actual.strftime('%A %d %b %H:%M')}"
+        assert schedule == list(MONDAY_INITIAL_SCHEDULE), f"got {_local(schedule)}"
     
     def test_friday_4pm_schedule(self, default_config, mel_tz):
         """PR on Friday 4pm should roll to Monday"""
@@ -186,11 +218,9 @@ class TestCalculateInitialSchedule:
         pr_epoch = pr_dt.timestamp()
         
         schedule = calculate_initial_schedule(pr_epoch, pr_epoch, default_config)
-        schedule_dts = [datetime.fromtimestamp(t, tz=mel_tz) for t in schedule]
         
         # First reminder should be Monday 9am
-        assert schedule_dts[0].weekday() == 0  # Monday
-        assert schedule_dts[0].hour == 9
+        assert schedule[0] == _ep(2026, 1, 26, 9)
 
 
 class TestCalculateTopupSchedule:
@@ -198,92 +228,36 @@ class TestCalculateTopupSchedule:
     
     def test_tuesday_eventbridge_topup(self, default_config, mel_tz):
         """EventBridge run on Tuesday should add Thursday reminders"""
-        pr_dt = datetime(2026, 1, 19, 12, 5, tzinfo=mel_tz)
-        pr_epoch = pr_dt.timestamp()
-        
-        # Initial schedule from Monday
-        initial_schedule = [
-            datetime(2026, 1, 19, 15, 5, tzinfo=mel_tz).timestamp(),   # Monday 15:05
-            datetime(2026, 1, 20, 9, 0, tzinfo=mel_tz).timestamp(),    # Tuesday 09:00
-            datetime(2026, 1, 20, 12, 0, tzinfo=mel_tz).timestamp(),   # Tuesday 12:00
-            datetime(2026, 1, 20, 15, 0, tzinfo=mel_tz).timestamp(),   # Tuesday 15:00
-            datetime(2026, 1, 21, 9, 0, tzinfo=mel_tz).timestamp(),    # Wednesday 09:00
-            datetime(2026, 1, 21, 12, 0, tzinfo=mel_tz).timestamp(),   # Wednesday 12:00
-            datetime(2026, 1, 21, 15, 0, tzinfo=mel_tz).timestamp(),   # Wednesday 15:00
-        ]
-        
         # EventBridge runs Tuesday 11:05am
-        eb_dt = datetime(2026, 1, 20, 11, 5, tzinfo=mel_tz)
-        eb_epoch = eb_dt.timestamp()
+        eb_epoch = _ep(2026, 1, 20, 11, 5)
         
         new_reminders = calculate_topup_schedule(
-            initial_schedule,
+            list(MONDAY_INITIAL_SCHEDULE),
             eb_epoch,
-            pr_epoch,
+            PR_MONDAY_1205,
             default_config
         )
         
-        new_dts = [datetime.fromtimestamp(t, tz=mel_tz) for t in new_reminders]
-        
-        expected_new = [
-            datetime(2026, 1, 22, 9, 0, tzinfo=mel_tz),    # Thursday 09:00
-            datetime(2026, 1, 22, 12, 0, tzinfo=mel_tz),   # Thursday 12:00
-            datetime(2026, 1, 22, 15, 0, tzinfo=mel_tz),   # Thursday 15:00
-        ]
-        
-        assert len(new_dts) == len(expected_new), f"Expected {len(expected_new)} new reminders, got {len(new_dts)}"
-        
-        for i, (actual, exp) in enumerate(zip(new_dts, expected_new)):
-            assert actual == exp, f"New reminder {i+1}: expected {exp.strftime('%A %d %b %H:%M')}, got {actual.strftime('%A %d %b %H:%M')}"
+        assert new_reminders == list(THURSDAY_TOPUP), f"got {_local(new_reminders)}"
     
     def test_wednesday_eventbridge_topup(self, default_config, mel_tz):
         """EventBridge run on Wednesday should add Friday reminders"""
-        pr_dt = datetime(2026, 1, 19, 12, 5, tzinfo=mel_tz)
-        pr_epoch = pr_dt.timestamp()
-        
-        # Schedule after Tuesday top-up
-        tuesday_schedule = [
-            datetime(2026, 1, 20, 12, 0, tzinfo=mel_tz).timestamp(),   # Tuesday 12:00
-            datetime(2026, 1, 20, 15, 0, tzinfo=mel_tz).timestamp(),   # Tuesday 15:00
-            datetime(2026, 1, 21, 9, 0, tzinfo=mel_tz).timestamp(),    # Wednesday 09:00
-            datetime(2026, 1, 21, 12, 0, tzinfo=mel_tz).timestamp(),   # Wednesday 12:00
-            datetime(2026, 1, 21, 15, 0, tzinfo=mel_tz).timestamp(),   # Wednesday 15:00
-            datetime(2026, 1, 22, 9, 0, tzinfo=mel_tz).timestamp(),    # Thursday 09:00
-            datetime(2026, 1, 22, 12, 0, tzinfo=mel_tz).timestamp(),   # Thursday 12:00
-            datetime(2026, 1, 22, 15, 0, tzinfo=mel_tz).timestamp(),   # Thursday 15:00
-        ]
-        
         # EventBridge runs Wednesday 11:05am
-        eb_dt = datetime(2026, 1, 21, 11, 5, tzinfo=mel_tz)
-        eb_epoch = eb_dt.timestamp()
+        eb_epoch = _ep(2026, 1, 21, 11, 5)
         
         new_reminders = calculate_topup_schedule(
-            tuesday_schedule,
+            list(TUESDAY_SCHEDULE),
             eb_epoch,
-            pr_epoch,
+            PR_MONDAY_1205,
             default_config
         )
         
-        new_dts = [datetime.fromtimestamp(t, tz=mel_tz) for t in new_reminders]
-        
-        expected_new = [
-            datetime(2026, 1, 23, 9, 0, tzinfo=mel_tz),    # Friday 09:00
-            datetime(2026, 1, 23, 12, 0, tzinfo=mel_tz),   # Friday 12:00
-            datetime(2026, 1, 23, 15, 0, tzinfo=mel_tz),   # Friday 15:00
-        ]
-        
-        assert len(new_dts) == len(expected_new), f"Expected {len(expected_new)} new reminders, got {len(new_dts)}"
-        
-        for i, (actual, exp) in enumerate(zip(new_dts, expected_new)):
-            assert actual == exp, f"New reminder {i+1}: expected {exp.strftime('%A %d %b %H:%M')}, got {actual.strftime('%A %d %b %H:%M')}"
+        assert new_reminders == list(FRIDAY_TOPUP), f"got {_local(new_reminders)}"
     
     def test_respects_window_size(self, default_config, mel_tz):
         """Top-up should not schedule beyond WINDOW_SIZE days"""
-        pr_dt = datetime(2026, 1, 19, 12, 5, tzinfo=mel_tz)
-        pr_epoch = pr_dt.timestamp()
-        
         existing = [
-            datetime(2026, 1, 21, 15, 0, tzinfo=mel_tz).timestamp(),  # Wednesday 15:00
+            _ep(2026, 1, 21, 15),  # Wednesday 15:00
         ]
         
         # EventBridge runs Tuesday 11:05am
@@ -293,16 +267,73 @@ class TestCalculateTopupSchedule:
         new_reminders = calculate_topup_schedule(
             existing,
             eb_epoch,
-            pr_epoch,
+            PR_MONDAY_1205,
             default_config
         )
         
-        new_dts = [datetime.fromtimestamp(t, tz=mel_tz) for t in new_reminders]
-        
         # Should only add up to Thursday 17:00 (2 business days from Tuesday)
         # Should not add Friday
-        for dt in new_dts:
-            assert dt.day <= 22, f"Should not schedule beyond Thursday (22nd), but found {dt.strftime('%A %d %b')}"
+        window_end = _ep(2026, 1, 22, 17)
+        assert all(t <= window_end for t in new_reminders), f"Scheduled beyond Thursday: {_local(new_reminders)}"
+    
+    def test_precomputed_target_matches_default(self, default_config, mel_tz):
+        """Passing the shared window target should give the same top-up as computing it per call"""
+        from scheduling import calculate_window_target
+        
+        eb_epoch = _ep(2026, 1, 20, 11, 5)
+        target = calculate_window_target(eb_epoch, default_config)
+        
+        assert calculate_topup_schedule([], eb_epoch, PR_MONDAY_1205, default_config, target) == \
+            calculate_topup_schedule([], eb_epoch, PR_MONDAY_1205, default_config)
+
+
+class TestCalculateWindowTarget:
+    """Tests for calculate_window_target function"""
+
+    @pytest.mark.parametrize("now,window_size,expected", [
+        (datetime(2026, 1, 19, 10, 0), 2, datetime(2026, 1, 21, 17, 0)),  # Monday -> Wednesday
+        (datetime(2026, 1, 23, 10, 0), 2, datetime(2026, 1, 27, 17, 0)),  # Friday -> Tuesday
+        (datetime(2026, 1, 24, 10, 0), 5, datetime(2026, 1, 30, 17, 0)),  # Saturday -> Friday
+        (datetime(2026, 1, 21, 10, 0), 7, datetime(2026, 1, 30, 17, 0)),  # Wednesday -> Friday next week
+    ])
+    def test_counts_business_days(self, now, window_size, expected, mel_tz):
+        """Target is end of business hours window_size business days after today"""
+        from scheduling import calculate_window_target
+        config = SchedulingConfig(window_size=window_size)
+        result = calculate_window_target(now.replace(tzinfo=mel_tz).timestamp(), config)
+        assert result == int(expected.replace(tzinfo=mel_tz).timestamp())
+
+
+class TestAddBusinessDays:
+    """Tests for the closed-form business-day offset behind the window target"""
+
+    @pytest.mark.parametrize("n", range(11))
+    def test_matches_day_by_day_count(self, n):
+        """Closed form should agree with counting weekdays one calendar day at a time"""
+        from scheduling import _add_business_days, _EPOCH_ORDINAL
+        
+        for start in range(7):
+            days = date(2026, 1, 19).toordinal() - _EPOCH_ORDINAL + start  # Monday 19 Jan 2026 onwards
+            expected, added = days, 0
+            while added < n:
+                expected += 1
+                if date.fromordinal(expected + _EPOCH_ORDINAL).weekday() < 5:
+                    added += 1
+            
+            assert _add_business_days(days, n) == expected
+
+
+class TestFormatLocalTime:
+    """Tests for format_local_time function"""
+
+    @pytest.mark.parametrize("dt", [
+        datetime(2026, 1, 19, 9, 0, tzinfo=MEL_TZ),   # Daylight time
+        datetime(2026, 6, 15, 14, 30, tzinfo=MEL_TZ),  # Standard time
+    ])
+    def test_matches_datetime_strftime(self, dt, default_config):
+        """Formatted local time should match datetime's own formatting"""
+        from scheduling import format_local_time
+        assert format_local_time(int(dt.timestamp()), default_config) == dt.strftime("%Y-%m-%d %H:%M")
 
 
 if __name__ == "__main__":